@@ -1,31 +1,21 @@
-import os
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
-from dotenv import load_dotenv
 import logging
 
-# Load environment variables
-load_dotenv()
-
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class QuestionAnsweringAgent:
-    def __init__(self, rag_system):
+    def __init__(self, rag_system, temperature=0.2):
         """Initialize the QA agent with a RAG system."""
         self.rag_system = rag_system
-        self.api_key = os.getenv("GOOGLE_API_KEY")
-        if not self.api_key:
-            raise ValueError("GOOGLE_API_KEY environment variable not set")
-        
-        # Set up the Gemini model for the agent
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=self.api_key,
-            temperature=0.2
-        )
-    
+
+        # Reuse the RAG system's Gemini client instead of building a
+        # second one per agent; the shallow copy shares the underlying
+        # client while keeping the agents at their own (cooler)
+        # sampling temperature
+        self.llm = rag_system.llm.copy(update={"temperature": temperature})
+
     def answer_question(self, question):
         """
         Uses the RAG system to answer a question about the documents.
@@ -35,20 +25,23 @@ class QuestionAnsweringAgent:
         result = self.rag_system.query(question)
         return result
 
+    async def aanswer_question(self, question):
+        """
+        Async version of answer_question, for async request handlers.
+        """
+        logger.info(f"Answering question: {question}")
+        result = await self.rag_system.aquery(question)
+        return result
+
 
 class DocumentAnalysisAgent:
-    def __init__(self, rag_system):
+    def __init__(self, rag_system, temperature=0.2):
         """Initialize the document analysis agent with a RAG system."""
         self.rag_system = rag_system
-        self.api_key = os.getenv("GOOGLE_API_KEY")
-        if not self.api_key:
-            raise ValueError("GOOGLE_API_KEY environment variable not set")
-        
-        # Set up the Gemini model for the agent
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=self.api_key,
-            temperature=0.2
-        )
-    
-    
\ No newline at end of file
+
+        # Reuse the RAG system's Gemini client instead of building a
+        # second one per agent; the shallow copy shares the underlying
+        # client while keeping the agents at their own (cooler)
+        # sampling temperature
+        self.llm = rag_system.llm.copy(update={"temperature": temperature})
+
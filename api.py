@@ -1,7 +1,7 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
+import asyncio
 import os
-import glob
 from document_processor import process_documents
 from rag_system import RAGSystem
 from agents import QuestionAnsweringAgent, DocumentAnalysisAgent
@@ -42,7 +42,7 @@ PDF_DIR = find_pdf_directory()
 logger.info(f"Using PDF directory: {PDF_DIR}")
 
 # Check if directory contains PDFs
-pdf_files = glob.glob(os.path.join(PDF_DIR, "*.pdf"))
+pdf_files = utils.scan_pdfs(PDF_DIR)
 if pdf_files:
     logger.info(f"Found {len(pdf_files)} PDF files in {PDF_DIR}")
 else:
@@ -57,7 +57,7 @@ analysis_agent = DocumentAnalysisAgent(rag_system)
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    pdf_count = len(glob.glob(os.path.join(PDF_DIR, "*.pdf")))
+    pdf_count = len(utils.scan_pdfs(PDF_DIR))
     return jsonify({
         "status": "healthy", 
         "pdf_directory": PDF_DIR,
@@ -65,13 +65,22 @@ def health_check():
     }), 200
 
 @app.route('/api/process-documents', methods=['POST'])
-def process_docs():
+async def process_docs():
     try:
-        # Process all PDFs in the configured PDF directory
-        result = process_documents(PDF_DIR)
-        
+        # Process all PDFs in the configured PDF directory; run the
+        # CPU/IO-heavy work on a thread so the event loop stays free
+        result = await asyncio.to_thread(process_documents, PDF_DIR)
+
+        # Collect the chunks produced above so the vector store doesn't
+        # load and split the same PDFs a second time (they are also not
+        # JSON-serializable, so strip them from the response details)
+        all_chunks = []
+        for file_result in result["files"]:
+            all_chunks.extend(file_result.pop("documents", []))
+
         # Initialize the RAG system with the processed documents
-        rag_system.initialize_vector_store()
+        await asyncio.to_thread(rag_system.initialize_vector_store,
+                                documents=all_chunks or None)
         
         return jsonify({
             "status": "success", 
@@ -84,15 +93,16 @@ def process_docs():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/api/ask', methods=['POST'])
-def ask_question():
+async def ask_question():
     try:
         data = request.json
         query = data.get('query', '')
         if not query:
             return jsonify({"status": "error", "message": "Query is required"}), 400
-        
-        # Use the QA agent to answer the question
-        response = qa_agent.answer_question(query)
+
+        # Use the QA agent to answer the question; awaiting here lets the
+        # server multiplex other requests during the Gemini call
+        response = await qa_agent.aanswer_question(query)
         
         return jsonify({
             "status": "success", 
@@ -103,6 +113,26 @@ def ask_question():
         logger.exception("Error answering question")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/api/ask-stream', methods=['POST'])
+def ask_question_stream():
+    data = request.json
+    query = data.get('query', '')
+    if not query:
+        return jsonify({"status": "error", "message": "Query is required"}), 400
+
+    # Stream the answer as Server-Sent Events so clients can render
+    # tokens as they arrive instead of waiting for the full generation
+    def generate():
+        try:
+            for event in rag_system.query_stream(query):
+                yield f"data: {json.dumps(event)}\n\n"
+            yield f"data: {json.dumps({'done': True})}\n\n"
+        except Exception as e:
+            logger.exception("Error streaming answer")
+            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
 # @app.route('/api/analyze', methods=['POST'])
 # def analyze_documents():
 #     try:
@@ -135,4 +165,8 @@ def get_documents():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Development server only - it handles one request at a time and the
+    # debug instrumentation slows every request. Production deployments
+    # should run under gunicorn via wsgi.py (see README).
+    app.run(debug=os.getenv("FLASK_DEV", "").lower() in ("1", "true", "yes"),
+            host='0.0.0.0', port=5000)
\ No newline at end of file
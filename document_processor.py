@@ -1,30 +1,67 @@
 import os
-from langchain_community.document_loaders import PyPDFLoader
+from functools import partial
+from multiprocessing import Pool
+from langchain_community.document_loaders import PyMuPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 import logging
-import glob
+import utils
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def process_documents(pdf_directory):
+def _process_one_pdf(pdf_path, chunk_size=1000, chunk_overlap=200):
     """
-    Process all PDF documents in the given directory.
+    Load and split a single PDF. Runs inside a worker process, so it builds
+    its own text splitter (no shared state to pickle).
+    Returns a result dict for the file.
+    """
+    pdf_file = os.path.basename(pdf_path)
+    try:
+        # Load the PDF
+        loader = PyMuPDFLoader(pdf_path)
+        documents = loader.load()
+
+        # Split the document into chunks
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+        )
+        chunks = text_splitter.split_documents(documents)
+
+        return {
+            "filename": pdf_file,
+            "status": "success",
+            "chunks": len(chunks),
+            "pages": len(documents),
+            "documents": chunks
+        }
+    except Exception as e:
+        return {
+            "filename": pdf_file,
+            "status": "failed",
+            "error": str(e)
+        }
+
+def process_documents(pdf_directory, workers=None):
+    """
+    Process all PDF documents in the given directory, dispatching each PDF
+    to a worker process since PDF parsing is CPU-bound.
     Returns a dictionary with processing results.
     """
     logger.info(f"Processing documents from directory: {pdf_directory}")
-    
+
     # Handle Windows path issues by normalizing the path
     pdf_directory = os.path.normpath(pdf_directory)
-    
+
     if not os.path.exists(pdf_directory):
         logger.error(f"PDF directory does not exist: {pdf_directory}")
         logger.info("Trying alternative approaches to find the directory...")
-        
+
         # Try to find the directory relative to the current file
         current_dir = os.path.dirname(os.path.abspath(__file__))
         relative_pdf_dir = os.path.join(os.path.dirname(current_dir), 'data', 'pdfs')
-        
+
         if os.path.exists(relative_pdf_dir):
             logger.info(f"Found relative PDF directory: {relative_pdf_dir}")
             pdf_directory = relative_pdf_dir
@@ -36,11 +73,12 @@ def process_documents(pdf_directory):
                 pdf_directory = raw_path
             else:
                 raise FileNotFoundError(f"PDF directory not found: {pdf_directory}")
-    
-    # Find PDF files using glob pattern (more robust across platforms)
-    pdf_pattern = os.path.join(pdf_directory, "*.pdf")
-    pdf_files = glob.glob(pdf_pattern)
-    
+
+    # Find PDF files in a single scandir pass; skip the TTL memo here -
+    # this is the ingestion path and must see PDFs uploaded moments ago,
+    # even if a health probe cached a listing from before the upload
+    pdf_files = [entry.path for entry in utils.scan_pdfs(pdf_directory, use_cache=False)]
+
     if not pdf_files:
         logger.warning(f"No PDF files found in {pdf_directory}")
         logger.info("Available files in directory:")
@@ -50,65 +88,42 @@ def process_documents(pdf_directory):
                 logger.info(f"  - {file}")
         except:
             logger.error("Could not list directory contents")
-        
+
         return {"processed": 0, "failed": 0, "files": []}
-    
+
     # Get just the filenames, not the full paths
     pdf_filenames = [os.path.basename(f) for f in pdf_files]
     logger.info(f"Found {len(pdf_files)} PDF files: {pdf_filenames}")
-    
+
     # Initialize counters and results
     processed_count = 0
     failed_count = 0
     processed_files = []
-    
-    # Create text splitter
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len,
-    )
-    
-    # Process each PDF
-    for pdf_path in pdf_files:
-        pdf_file = os.path.basename(pdf_path)
-        try:
-            logger.info(f"Processing {pdf_file}...")
-            
-            # Load the PDF
-            loader = PyPDFLoader(pdf_path)
-            documents = loader.load()
-            
-            logger.info(f"Loaded {len(documents)} pages from {pdf_file}")
-            
-            # Split the document into chunks
-            chunks = text_splitter.split_documents(documents)
-            
-            logger.info(f"Extracted {len(chunks)} chunks from {pdf_file}")
-            
-            processed_count += 1
-            processed_files.append({
-                "filename": pdf_file,
-                "status": "success",
-                "chunks": len(chunks),
-                "pages": len(documents)
-            })
-            
-        except Exception as e:
-            logger.error(f"Failed to process {pdf_file}: {str(e)}")
-            failed_count += 1
-            processed_files.append({
-                "filename": pdf_file,
-                "status": "failed",
-                "error": str(e)
-            })
-    
+
+    # Process the PDFs in parallel; 4 workers is the sweet spot before
+    # process overhead eats the gains
+    if workers is None:
+        workers = min(os.cpu_count() or 1, 4)
+    workers = min(workers, len(pdf_files))
+
+    worker_fn = partial(_process_one_pdf, chunk_size=1000, chunk_overlap=200)
+    with Pool(processes=workers) as pool:
+        for result in pool.imap_unordered(worker_fn, pdf_files):
+            if result["status"] == "success":
+                logger.info(f"Processed {result['filename']}: "
+                            f"{result['pages']} pages, {result['chunks']} chunks")
+                processed_count += 1
+            else:
+                logger.error(f"Failed to process {result['filename']}: {result['error']}")
+                failed_count += 1
+            processed_files.append(result)
+
     result = {
         "processed": processed_count,
         "failed": failed_count,
         "files": processed_files
     }
-    
+
     logger.info(f"Document processing complete. Processed: {processed_count}, Failed: {failed_count}")
     return result
 
@@ -124,7 +139,7 @@ if __name__ == "__main__":
             "F:\\softograph\\rag_langchain_project\\data\\pdfs",
             os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'pdfs')
         ]
-        
+
         for path in possible_paths:
             print(f"Trying path: {path}")
             if os.path.exists(path):
@@ -134,7 +149,11 @@ if __name__ == "__main__":
         else:
             print("Could not find a valid PDF directory")
             sys.exit(1)
-    
+
     print(f"Testing document processor with directory: {dir_path}")
     result = process_documents(dir_path)
-    print(result)
\ No newline at end of file
+    # Per-file results carry the chunk objects for downstream indexing;
+    # strip them so the diagnostic output stays a short summary
+    for file_result in result["files"]:
+        file_result.pop("documents", None)
+    print(result)
@@ -1,6 +1,8 @@
 import os
 import sys
 
+import utils
+
 def find_pdfs():
     """
     Diagnostic tool to find PDF files in a directory.
@@ -12,18 +14,19 @@ def find_pdfs():
     # Check if directory exists
     if os.path.exists(specified_path):
         print(f"✓ Directory exists: {specified_path}")
-        files = os.listdir(specified_path)
-        pdf_files = [f for f in files if f.lower().endswith('.pdf')]
-        
+        pdf_files = utils.scan_pdfs(specified_path)
+
         if pdf_files:
             print(f"✓ Found {len(pdf_files)} PDF files:")
-            for pdf in pdf_files:
-                full_path = os.path.join(specified_path, pdf)
-                size_kb = os.path.getsize(full_path) / 1024
-                print(f"   - {pdf} ({size_kb:.2f} KB)")
+            for entry in pdf_files:
+                size_kb = entry.stat().st_size / 1024
+                print(f"   - {entry.name} ({size_kb:.2f} KB)")
         else:
             print("✗ No PDF files found in this directory")
             print("  Files in directory:")
+            # Only list the directory in the empty case; the scan above
+            # already covers the happy path
+            files = os.listdir(specified_path)
             if files:
                 for file in files:
                     print(f"   - {file}")
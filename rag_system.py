@@ -1,14 +1,24 @@
 import os
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
 import google.generativeai as genai
 from langchain.prompts import PromptTemplate
 from langchain.chains import RetrievalQA
+from langchain.chains.question_answering import load_qa_chain
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.vectorstores import Chroma
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.document_loaders import PyPDFLoader
+from langchain_community.document_loaders import PyMuPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.schema import Document
 from dotenv import load_dotenv
 import logging
+import utils
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,8 +26,74 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+_QA_TEMPLATE = """
+        You are a helpful AI assistant that provides accurate information based on the given context.
+
+        Context:
+        {context}
+
+        Question:
+        {question}
+
+        Please provide a detailed answer based only on the provided context. If the context doesn't contain
+        relevant information to answer the question, state that you don't have enough information.
+        """
+
+# Explicit HNSW settings for the Chroma collection (cosine space, higher
+# M/ef than the defaults for better recall at log-time search cost)
+_HNSW_COLLECTION_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+}
+
+def _load_and_split(pdf_path, chunk_size=1000, chunk_overlap=200):
+    """
+    Load and split a single PDF. Top-level so it can be pickled into a
+    worker process; the splitter is built locally for the same reason.
+    """
+    loader = PyMuPDFLoader(pdf_path)
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+    )
+    return text_splitter.split_documents(loader.load())
+
+def _file_sha256(file_path):
+    """Hash a whole file; used to detect changed PDFs between runs."""
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+# LRU cache of query embeddings keyed by query hash; there is one
+# embeddings client per process, so a module-level cache is enough
+_QUERY_EMBED_CACHE = {}
+_QUERY_EMBED_CACHE_SIZE = 1024
+
+class _CachedQueryEmbeddings(GoogleGenerativeAIEmbeddings):
+    """
+    GoogleGenerativeAIEmbeddings with an LRU cache on embed_query, so
+    exact-repeat queries (common in FAQ-style usage) skip the embedding
+    API round-trip. Works for both direct calls and the retriever, which
+    embeds through the same instance.
+    """
+    def embed_query(self, text):
+        key = hashlib.blake2b(text.encode()).digest()
+        cached = _QUERY_EMBED_CACHE.pop(key, None)
+        if cached is None:
+            cached = tuple(super().embed_query(text))
+        # Re-insert so the most recently used entry is evicted last
+        _QUERY_EMBED_CACHE[key] = cached
+        while len(_QUERY_EMBED_CACHE) > _QUERY_EMBED_CACHE_SIZE:
+            _QUERY_EMBED_CACHE.pop(next(iter(_QUERY_EMBED_CACHE)))
+        return list(cached)
+
 class RAGSystem:
-    def __init__(self, pdf_dir=None):
+    def __init__(self, pdf_dir=None, cache_embeddings=True):
         """Initialize the RAG system with Google's Gemini model."""
         self.api_key = os.getenv("GOOGLE_API_KEY")
         if not self.api_key:
@@ -25,8 +101,9 @@ class RAGSystem:
         
         genai.configure(api_key=self.api_key)
         
-        # Set up embedding model
-        self.embeddings = GoogleGenerativeAIEmbeddings(
+        # Set up embedding model (with query-embedding caching by default)
+        embeddings_cls = _CachedQueryEmbeddings if cache_embeddings else GoogleGenerativeAIEmbeddings
+        self.embeddings = embeddings_cls(
             model="models/embedding-001",
             google_api_key=self.api_key
         )
@@ -58,134 +135,405 @@ class RAGSystem:
         
         # Initialize vector store to None (will be loaded/created when needed)
         self.vector_store = None
-    
-    def initialize_vector_store(self):
-        """Initialize or load the vector store with document embeddings."""
-        try:
-            # Check if vector store exists
-            if os.path.exists(self.vector_store_path) and os.listdir(self.vector_store_path):
-                logger.info("Loading existing vector store...")
-                self.vector_store = Chroma(
-                    persist_directory=self.vector_store_path,
-                    embedding_function=self.embeddings
-                )
-                logger.info(f"Vector store loaded with {self.vector_store._collection.count()} documents")
+
+        # Semantic cache: list of (timestamp, normalized query embedding,
+        # response dict). Near-duplicate questions are answered from here
+        # without touching the retriever or the LLM.
+        self._sem_cache = []
+        self._sem_cache_threshold = 0.92
+        self._sem_cache_ttl = 3600
+
+        # Prompt and QA chain are built once and reused; rebuilding them
+        # per query pays Runnable/Pydantic construction costs on the hot
+        # path for no benefit
+        self._prompt = PromptTemplate(
+            template=_QA_TEMPLATE,
+            input_variables=["context", "question"]
+        )
+        self._qa_chain = None
+
+    def _semantic_cache_lookup(self, query_embedding):
+        """
+        Return the cached response for the most similar cached query if its
+        cosine similarity clears the threshold, else None. Expired entries
+        are evicted as a side effect.
+        """
+        now = time.time()
+        self._sem_cache = [entry for entry in self._sem_cache
+                           if now - entry[0] < self._sem_cache_ttl]
+        if not self._sem_cache:
+            return None
+
+        # One matrix-vector product scores every cached query at once
+        cached = np.stack([entry[1] for entry in self._sem_cache])
+        sims = cached @ query_embedding
+        best = int(np.argmax(sims))
+        if sims[best] >= self._sem_cache_threshold:
+            logger.info(f"Semantic cache hit (similarity={sims[best]:.3f})")
+            return self._sem_cache[best][2]
+        return None
+
+    def _embed_query_normalized(self, query_text):
+        """Embed a query and L2-normalize it for cosine similarity."""
+        embedding = np.asarray(self.embeddings.embed_query(query_text), dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        if norm > 0:
+            embedding /= norm
+        return embedding
+
+    def _open_vector_store(self):
+        """Open (or create) the persistent Chroma collection."""
+        self.vector_store = Chroma(
+            persist_directory=self.vector_store_path,
+            embedding_function=self.embeddings,
+            collection_metadata=_HNSW_COLLECTION_METADATA
+        )
+
+    def _add_documents(self, documents, ids=None, batch_size=100, max_workers=8):
+        """
+        Add document chunks to the vector store, embedding them in
+        concurrent batches instead of letting Chroma embed one chunk at a
+        time (each embedding call is an HTTP round-trip to Gemini).
+        """
+        texts = [doc.page_content for doc in documents]
+        metadatas = [doc.metadata for doc in documents]
+
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        logger.info(f"Embedding {len(texts)} chunks in {len(batches)} batches...")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            embeddings = []
+            for batch_embeddings in executor.map(self.embeddings.embed_documents, batches):
+                embeddings.extend(batch_embeddings)
+
+        # Add the precomputed vectors directly, bypassing Chroma's serial
+        # embedding path
+        self.vector_store._collection.add(
+            embeddings=embeddings,
+            documents=texts,
+            metadatas=metadatas,
+            ids=ids if ids is not None else [str(uuid.uuid4()) for _ in texts]
+        )
+
+    def _hash_pdf_files(self):
+        """Return {filename: sha256} for every PDF in the PDF directory."""
+        # DirEntry.path is already the joined path from the directory
+        # read, so no per-file string building or re-resolution is needed
+        with os.scandir(self.pdf_dir) as entries:
+            return {entry.name: _file_sha256(entry.path)
+                    for entry in entries
+                    if entry.is_file() and utils.is_pdf_filename(entry.name)}
+
+    def _load_and_split_pdfs(self, pdf_files):
+        """
+        Load and split the given PDFs (filenames relative to pdf_dir),
+        one worker process per PDF since parsing is CPU-bound.
+        """
+        pdf_paths = [os.path.join(self.pdf_dir, f) for f in pdf_files]
+        logger.info(f"Loading {len(pdf_paths)} PDFs for vector store...")
+
+        workers = min(os.cpu_count() or 1, 4, len(pdf_paths))
+        documents = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunks in executor.map(_load_and_split, pdf_paths):
+                documents.extend(chunks)
+
+        return documents
+
+    def _index_chunks(self, chunks, file_hashes):
+        """
+        Tag each chunk with its source file hash and add it under an id
+        derived from the source and content hashes. Dedupe is scoped to
+        a single file: repeated chunks within one PDF (boilerplate
+        headers/footers, or content already indexed from an earlier run
+        of the same file) are embedded once, but the same content in two
+        files is stored per file - otherwise deleting one file's chunks
+        by source_hash would drop content another file still contains.
+        """
+        unique_chunks = []
+        ids = []
+        seen = set()
+        for chunk in chunks:
+            content_hash = hashlib.sha256(chunk.page_content.encode()).hexdigest()
+            source = os.path.basename(chunk.metadata.get("source", ""))
+            source_hash = file_hashes.get(source, "unknown")
+            chunk_id = hashlib.sha256(f"{source_hash}:{content_hash}".encode()).hexdigest()
+            if chunk_id in seen:
+                continue
+            seen.add(chunk_id)
+            chunk.metadata["source_hash"] = source_hash
+            unique_chunks.append(chunk)
+            ids.append(chunk_id)
+
+        # Nothing to index (e.g. the only changed PDF is a scan with no
+        # extractable text); chromadb rejects get(ids=[]) outright
+        if not ids:
+            return
+
+        # Content already in the store doesn't need re-embedding either
+        existing = set(self.vector_store._collection.get(ids=ids)["ids"])
+        if existing:
+            kept = [(chunk, chunk_id) for chunk, chunk_id in zip(unique_chunks, ids)
+                    if chunk_id not in existing]
+            unique_chunks = [chunk for chunk, _ in kept]
+            ids = [chunk_id for _, chunk_id in kept]
+
+        skipped = len(chunks) - len(unique_chunks)
+        if skipped:
+            logger.info(f"Skipping {skipped} duplicate chunks")
+        if unique_chunks:
+            self._add_documents(unique_chunks, ids=ids)
+
+    def _sync_vector_store(self, pre_split=None):
+        """
+        Incrementally bring the vector store in line with the PDF
+        directory: only new or changed files (by content hash) are
+        embedded, and chunks of removed files are deleted. A manifest of
+        {filename: sha256} in the vector store directory tracks what is
+        already indexed.
+        """
+        manifest_path = os.path.join(self.vector_store_path, 'manifest.json')
+        manifest = utils.load_json_data(manifest_path) or {}
+
+        file_hashes = self._hash_pdf_files()
+        if not file_hashes and not manifest:
+            if self.vector_store._collection.count() > 0:
+                logger.warning(f"No PDF files found in {self.pdf_dir}, "
+                               "keeping existing vector store")
+                return
+            raise ValueError(f"No PDF files found in {self.pdf_dir}")
+
+        # A non-empty collection without a manifest predates incremental
+        # syncing: its chunks have UUID ids and no source_hash metadata,
+        # so the delete-by-hash loop below can't touch them and re-adding
+        # the same content under content-hash ids would double the
+        # corpus. Clear it once and rebuild from scratch.
+        if not manifest and self.vector_store._collection.count() > 0:
+            logger.info("Rebuilding pre-manifest vector store with content-hash ids")
+            legacy_ids = self.vector_store._collection.get(include=[])["ids"]
+            if legacy_ids:
+                self.vector_store._collection.delete(ids=legacy_ids)
+
+        removed = [f for f in manifest if f not in file_hashes]
+        changed = [f for f, h in file_hashes.items() if manifest.get(f) != h]
+
+        # Drop chunks of removed files and stale chunks of changed files
+        for pdf_file in removed + [f for f in changed if f in manifest]:
+            self.vector_store._collection.delete(where={"source_hash": manifest[pdf_file]})
+
+        if changed:
+            if pre_split is not None:
+                changed_set = set(changed)
+                chunks = [c for c in pre_split
+                          if os.path.basename(c.metadata.get("source", "")) in changed_set]
             else:
-                logger.info("Creating new vector store...")
-                # Create directory if it doesn't exist
-                os.makedirs(self.vector_store_path, exist_ok=True)
-                
-                # Load and process all PDFs
-                documents = []
-                text_splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=1000,
-                    chunk_overlap=200,
-                    length_function=len,
-                )
-                
-                # Get list of PDF files
-                if not os.path.exists(self.pdf_dir):
-                    logger.error(f"PDF directory does not exist: {self.pdf_dir}")
-                    raise FileNotFoundError(f"PDF directory not found: {self.pdf_dir}")
-                
-                pdf_files = [f for f in os.listdir(self.pdf_dir) if f.lower().endswith('.pdf')]
-                
-                if not pdf_files:
-                    logger.warning(f"No PDF files found in {self.pdf_dir}")
-                    raise ValueError(f"No PDF files found in {self.pdf_dir}")
-                
-                for pdf_file in pdf_files:
-                    pdf_path = os.path.join(self.pdf_dir, pdf_file)
-                    logger.info(f"Loading {pdf_file} for vector store...")
-                    
-                    # Load the PDF
-                    loader = PyPDFLoader(pdf_path)
-                    pdf_documents = loader.load()
-                    
-                    # Split the document into chunks
-                    chunks = text_splitter.split_documents(pdf_documents)
-                    documents.extend(chunks)
-                
-                logger.info(f"Creating vector store with {len(documents)} chunks...")
-                
-                # Create vector store
-                self.vector_store = Chroma.from_documents(
-                    documents=documents,
-                    embedding=self.embeddings,
-                    persist_directory=self.vector_store_path
-                )
-                
-                # Persist vector store
-                self.vector_store.persist()
-                logger.info("Vector store created and persisted successfully")
-            
+                chunks = self._load_and_split_pdfs(changed)
+            self._index_chunks(chunks, file_hashes)
+
+            # A changed file can yield no chunks at all (parse failed
+            # upstream, or a scanned PDF with no extractable text); keep
+            # it out of the manifest so the next sync retries it instead
+            # of recording content that was never indexed
+            indexed = {os.path.basename(c.metadata.get("source", "")) for c in chunks}
+            not_indexed = [f for f in changed if f not in indexed]
+            if not_indexed:
+                logger.warning(f"No chunks produced for {not_indexed}, "
+                               "leaving them out of the manifest")
+                file_hashes = {f: h for f, h in file_hashes.items()
+                               if f not in not_indexed}
+
+        if removed or changed:
+            self.vector_store.persist()
+            utils.save_json_data(file_hashes, manifest_path)
+            logger.info(f"Vector store synced: {len(changed)} files indexed, "
+                        f"{len(removed)} removed, "
+                        f"{self.vector_store._collection.count()} chunks total")
+        else:
+            logger.info(f"Vector store up to date with "
+                        f"{self.vector_store._collection.count()} chunks")
+
+    def initialize_vector_store(self, documents=None):
+        """
+        Initialize the vector store and sync it with the PDF directory.
+        Only new or changed PDFs are embedded. If pre-split document
+        chunks are passed in, they are indexed directly so the PDFs are
+        not loaded and split a second time.
+        """
+        try:
+            if not os.path.exists(self.pdf_dir):
+                logger.error(f"PDF directory does not exist: {self.pdf_dir}")
+                raise FileNotFoundError(f"PDF directory not found: {self.pdf_dir}")
+
+            os.makedirs(self.vector_store_path, exist_ok=True)
+            self._open_vector_store()
+            self._sync_vector_store(pre_split=documents)
             return True
         except Exception as e:
             logger.error(f"Failed to initialize vector store: {str(e)}")
             raise
     
-    def get_retriever(self):
+    def get_retriever(self, k=5):
         """Get the retriever from the vector store."""
         if self.vector_store is None:
             self.initialize_vector_store()
-        
+
         return self.vector_store.as_retriever(
             search_type="similarity",
-            search_kwargs={"k": 5}
+            search_kwargs={"k": k}
         )
-    
-    def query(self, query_text):
-        """
-        Query the RAG system with the given text.
-        Returns answer and source documents.
+
+    def _get_qa_chain(self):
+        """Get the RetrievalQA chain, building it on first use only."""
+        if self._qa_chain is None:
+            self._qa_chain = RetrievalQA.from_chain_type(
+                llm=self.llm,
+                chain_type="stuff",
+                retriever=self.get_retriever(),
+                return_source_documents=True,
+                chain_type_kwargs={"prompt": self._prompt}
+            )
+        return self._qa_chain
+
+    def _rerank_documents(self, query_text, documents, top_n=5):
         """
-        retriever = self.get_retriever()
-        
-        # Set up prompt template
-        template = """
-        You are a helpful AI assistant that provides accurate information based on the given context.
-        
-        Context:
-        {context}
-        
-        Question:
-        {question}
-        
-        Please provide a detailed answer based only on the provided context. If the context doesn't contain 
-        relevant information to answer the question, state that you don't have enough information.
+        Score all candidate passages for relevance in one batched LLM call
+        (instead of one call per passage) and keep the top_n. Falls back
+        to the original retriever order if the scores can't be parsed.
         """
-        
-        prompt = PromptTemplate(
-            template=template,
-            input_variables=["context", "question"]
+        passages = "\n".join(f"[{i}] {doc.page_content}" for i, doc in enumerate(documents))
+        grading_prompt = (
+            "Rate the relevance of each passage to the question on a scale of 0-10. "
+            f"Return only a JSON array of {len(documents)} numbers, one per passage, in order.\n"
+            f"Question: {query_text}\n"
+            f"{passages}"
         )
-        
-        # Create QA chain
-        qa_chain = RetrievalQA.from_chain_type(
+
+        response = self.llm.invoke(grading_prompt)
+        try:
+            content = response.content
+            scores = json.loads(content[content.index("["):content.rindex("]") + 1])
+            if len(scores) != len(documents):
+                raise ValueError(f"Expected {len(documents)} scores, got {len(scores)}")
+            # The model may pad the array with strings or nulls; those
+            # would blow up in the sort below, outside this guard
+            if not all(isinstance(s, (int, float)) for s in scores):
+                raise ValueError(f"Non-numeric scores: {scores}")
+        except (ValueError, json.JSONDecodeError) as e:
+            logger.warning(f"Could not parse reranker scores, keeping retriever order: {e}")
+            return documents[:top_n]
+
+        ranked = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)
+        return [documents[i] for i in ranked[:top_n]]
+
+    def _query_with_rerank(self, query_text, fetch_k=15, top_n=5):
+        """
+        Retrieve a wider candidate set, rerank it with a single grading
+        call, and answer over the top passages.
+        """
+        retriever = self.get_retriever(k=fetch_k)
+        documents = retriever.get_relevant_documents(query_text)
+        documents = self._rerank_documents(query_text, documents, top_n=top_n)
+
+        stuff_chain = load_qa_chain(
             llm=self.llm,
             chain_type="stuff",
-            retriever=retriever,
-            return_source_documents=True,
-            chain_type_kwargs={"prompt": prompt}
+            prompt=self._prompt
         )
-        
-        # Execute query
-        result = qa_chain({"query": query_text})
-        
-        # Extract source information
-        sources = []
-        for doc in result["source_documents"]:
-            source_info = {
-                "content": doc.page_content[:150] + "...",  # First 150 chars
-                "metadata": doc.metadata
-            }
-            sources.append(source_info)
-        
+        output = stuff_chain({"input_documents": documents, "question": query_text})
+        return {"result": output["output_text"], "source_documents": documents}
+
+    def _format_sources(self, documents):
+        """Build the source previews for a set of retrieved documents."""
+        # Only slice when the content actually exceeds the preview length;
+        # short chunks are passed through without a copy
+        return [{
+            "content": (doc.page_content[:150] + "...")
+                       if len(doc.page_content) > 150 else doc.page_content,
+            "metadata": doc.metadata
+        } for doc in documents]
+
+    def _format_response(self, result):
+        """Turn a chain result into the answer/sources response dict."""
         return {
             "answer": result["result"],
-            "sources": sources
+            "sources": self._format_sources(result["source_documents"])
         }
-    
+
+    def query(self, query_text, rerank=False):
+        """
+        Query the RAG system with the given text.
+        Returns answer and source documents. With rerank=True, a wider
+        candidate set is retrieved and graded in one batched LLM call
+        before answering.
+        """
+        # Check the semantic cache first - a near-duplicate question is
+        # answered without the retriever or the LLM round-trip
+        query_embedding = self._embed_query_normalized(query_text)
+        cached = self._semantic_cache_lookup(query_embedding)
+        if cached is not None:
+            return cached
+
+        if rerank:
+            result = self._query_with_rerank(query_text)
+        else:
+            result = self._get_qa_chain()({"query": query_text})
+
+        response = self._format_response(result)
+        self._sem_cache.append((time.time(), query_embedding, response))
+        return response
+
+    async def aquery(self, query_text, rerank=False):
+        """
+        Async version of query(). The LLM call is awaited so the event
+        loop can serve other requests while Gemini generates; the
+        embedding step runs on a worker thread for the same reason.
+        """
+        query_embedding = await asyncio.to_thread(self._embed_query_normalized, query_text)
+        cached = self._semantic_cache_lookup(query_embedding)
+        if cached is not None:
+            return cached
+
+        if rerank:
+            result = await asyncio.to_thread(self._query_with_rerank, query_text)
+        else:
+            result = await self._get_qa_chain().ainvoke({"query": query_text})
+
+        response = self._format_response(result)
+        self._sem_cache.append((time.time(), query_embedding, response))
+        return response
+
+    def query_stream(self, query_text):
+        """
+        Stream the answer to a query. Yields one {"sources": [...]} event
+        once retrieval finishes, then a {"token": ...} event per generated
+        chunk, so callers can show tokens as Gemini produces them instead
+        of waiting for the full generation.
+        """
+        query_embedding = self._embed_query_normalized(query_text)
+        cached = self._semantic_cache_lookup(query_embedding)
+        if cached is not None:
+            yield {"sources": cached["sources"]}
+            yield {"token": cached["answer"]}
+            return
+
+        retriever = self.get_retriever()
+        documents = retriever.get_relevant_documents(query_text)
+        yield {"sources": self._format_sources(documents)}
+
+        context = "\n\n".join(doc.page_content for doc in documents)
+        chain = self._prompt | self.llm
+
+        answer_parts = []
+        for chunk in chain.stream({"context": context, "question": query_text}):
+            answer_parts.append(chunk.content)
+            yield {"token": chunk.content}
+
+        response = {
+            "answer": "".join(answer_parts),
+            "sources": self._format_sources(documents)
+        }
+        self._sem_cache.append((time.time(), query_embedding, response))
+
     def get_all_document_content(self):
         """
         Retrieve all document content from the vector store.
@@ -193,11 +541,14 @@ class RAGSystem:
         """
         if self.vector_store is None:
             self.initialize_vector_store()
-            
-        # This is a simplified version - in a real app, you might want to
-        # implement pagination or other optimizations for large document sets
-        results = self.vector_store.similarity_search(
-            "important information", k=100
+
+        # Fetch straight from the collection - a similarity search here
+        # would embed a sentinel query and walk the HNSW index just to
+        # approximate what is a plain scan
+        # (in a real app, you might want pagination for large document sets)
+        results = self.vector_store._collection.get(
+            limit=100, include=["documents", "metadatas"]
         )
-        
-        return results
\ No newline at end of file
+
+        return [Document(page_content=content, metadata=metadata or {})
+                for content, metadata in zip(results["documents"], results["metadatas"])]
\ No newline at end of file
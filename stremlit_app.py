@@ -1,5 +1,8 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+import aiofiles
+import asyncio
 import json
 import os
 import pandas as pd
@@ -17,14 +20,22 @@ st.set_page_config(
 # API URL
 API_URL = "http://localhost:5000/api"
 
+# Shared HTTP session so every rerun reuses keep-alive connections to
+# the API instead of paying a TCP handshake per call
+@st.cache_resource
+def _session():
+    session = requests.Session()
+    session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    return session
+
 # Function to make API calls
 def api_call(endpoint, method="GET", data=None):
     url = f"{API_URL}/{endpoint}"
     try:
         if method == "GET":
-            response = requests.get(url)
+            response = _session().get(url)
         elif method == "POST":
-            response = requests.post(url, json=data)
+            response = _session().post(url, json=data)
         else:
             st.error(f"Unsupported method: {method}")
             return None
@@ -76,8 +87,14 @@ st.markdown("""
 # Header
 st.markdown('<div class="main-header">📚 LangChain RAG Document System</div>', unsafe_allow_html=True)
 
+# Health is probed on every rerun, so cache it briefly to avoid
+# re-pinging the API on each button/radio click
+@st.cache_data(ttl=5)
+def get_health():
+    return api_call("health")
+
 # Get system health to check connection
-health_result = api_call("health")
+health_result = get_health()
 if health_result and health_result.get("status") == "healthy":
     pdf_directory = health_result.get("pdf_directory", "Unknown")
     pdf_count = health_result.get("pdf_count", 0)
@@ -153,6 +170,15 @@ elif page == "Document Explorer":
         else:
             # Convert to DataFrame for better display
             df = pd.DataFrame(documents)
+
+            # The API ships raw timestamps; format them only here, for
+            # display (isoformat is much cheaper than strftime). Error
+            # rows carry no timestamp, so leave their NaN alone.
+            if "modified_ts" in df.columns:
+                df["modified_date"] = df["modified_ts"].map(
+                    lambda ts: datetime.fromtimestamp(ts).isoformat(sep=' ', timespec='seconds')
+                    if pd.notna(ts) else None)
+                df = df.drop(columns=["modified_ts"])
             
             # Display as table
             st.dataframe(
@@ -161,7 +187,7 @@ elif page == "Document Explorer":
                     "filename": "Document Name",
                     "size_kb": st.column_config.NumberColumn("Size (KB)", format="%.2f KB"),
                     "modified_date": "Last Modified",
-                    "hash": "Document Hash"
+                    "file_id": "Document ID"
                 },
                 hide_index=True
             )
@@ -180,17 +206,42 @@ elif page == "Question Answering":
     
     if st.button("Submit Question"):
         if query:
-            with st.spinner("Generating answer..."):
-                result = api_call("ask", method="POST", data={"query": query})
-            
-            if result and result.get("status") == "success":
-                # Display answer
-                st.markdown("### Answer")
-                st.markdown(f'<div class="info-box">{result["answer"]}</div>', unsafe_allow_html=True)
-                
+            # Stream the answer token by token from the SSE endpoint so
+            # text appears as soon as the model starts generating
+            st.markdown("### Answer")
+            answer_placeholder = st.empty()
+            answer_text = ""
+            sources = []
+            failed = False
+            try:
+                response = _session().post(f"{API_URL}/ask-stream",
+                                           json={"query": query}, stream=True)
+                if response.status_code != 200:
+                    st.error(f"API Error: {response.status_code} - {response.text}")
+                    failed = True
+                else:
+                    for line in response.iter_lines():
+                        if not line.startswith(b"data: "):
+                            continue
+                        event = json.loads(line[len(b"data: "):])
+                        if "token" in event:
+                            answer_text += event["token"]
+                            answer_placeholder.markdown(
+                                f'<div class="info-box">{answer_text}</div>',
+                                unsafe_allow_html=True)
+                        elif "sources" in event:
+                            sources = event["sources"]
+                        elif "error" in event:
+                            st.error(f"API Error: {event['error']}")
+                            failed = True
+            except Exception as e:
+                st.error(f"API Connection Error: {str(e)}")
+                failed = True
+
+            if not failed:
                 # Display sources
                 st.markdown("### Sources")
-                for i, source in enumerate(result.get("sources", [])):
+                for i, source in enumerate(sources):
                     st.markdown(f"""
                     <div class="source-box">
                         <strong>Source {i+1}:</strong> {source.get('metadata', {}).get('source', 'Unknown')}
@@ -198,8 +249,6 @@ elif page == "Question Answering":
                         <em>{source.get('content', 'No content preview available')}</em>
                     </div>
                     """, unsafe_allow_html=True)
-            else:
-                st.error("Failed to get response")
         else:
             st.warning("Please enter a question")
 
@@ -208,7 +257,7 @@ elif page == "Upload PDFs":
     st.markdown('<div class="sub-header">Upload PDF Documents</div>', unsafe_allow_html=True)
     
     # Get PDF directory from API
-    health_result = api_call("health")
+    health_result = get_health()
     if health_result and health_result.get("status") == "healthy":
         pdf_directory = health_result.get("pdf_directory", "Unknown")
     else:
@@ -227,19 +276,24 @@ elif page == "Upload PDFs":
         if st.button("Save Uploaded Files"):
             saved_files = []
             failed_files = []
-            
-            for uploaded_file in uploaded_files:
-                try:
-                    # Create destination path
-                    dest_path = os.path.join(pdf_directory, uploaded_file.name)
-                    
-                    # Save the file
-                    with open(dest_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-                    
+
+            # Write all files concurrently instead of blocking on each
+            # disk write in turn
+            async def save_file(uploaded_file):
+                dest_path = os.path.join(pdf_directory, uploaded_file.name)
+                async with aiofiles.open(dest_path, "wb") as f:
+                    await f.write(uploaded_file.getbuffer())
+
+            async def save_all(files):
+                return await asyncio.gather(*(save_file(f) for f in files),
+                                            return_exceptions=True)
+
+            results = asyncio.run(save_all(uploaded_files))
+            for uploaded_file, outcome in zip(uploaded_files, results):
+                if isinstance(outcome, Exception):
+                    failed_files.append(f"{uploaded_file.name} - Error: {str(outcome)}")
+                else:
                     saved_files.append(uploaded_file.name)
-                except Exception as e:
-                    failed_files.append(f"{uploaded_file.name} - Error: {str(e)}")
             
             if saved_files:
                 st.success(f"Successfully saved {len(saved_files)} PDF files:")